@@ -8,6 +8,8 @@ import fileinput
 import shutil
 import importlib
 import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Pre-flight sanity checks
@@ -40,6 +42,12 @@ def from_server_path(path):
     return os.path.normpath(os.path.join(server_dir_path, path))
 
 
+# Frequently used paths, computed once
+config_path = from_dbtool_path("config.yaml")
+default_settings_path = from_server_path("settings/default")
+user_settings_path = from_server_path("settings")
+
+
 # - Repo should be checked out as a git repo, not as plain files
 if (
     not subprocess.call(
@@ -69,6 +77,12 @@ except Exception as e:
     )
     preflight_exit()
 
+# Prefer the libyaml-backed C loader/dumper when available, they are much faster
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
 GREEN = colorama.Fore.GREEN
 RED = colorama.Fore.RED
 RESET = colorama.Style.RESET_ALL
@@ -76,11 +90,11 @@ NOOP = lambda *args, **kwargs: None
 
 
 def print_red(str):
-    print(colorama.Fore.RED + str)
+    sys.stdout.write(f"{RED}{str}{RESET}\n")
 
 
 def print_green(str):
-    print(colorama.Fore.GREEN + str)
+    sys.stdout.write(f"{GREEN}{str}{RESET}\n")
 
 
 def populate_migrations():
@@ -95,75 +109,113 @@ def populate_migrations():
     return migration_list
 
 
-# Migrations are automatically scraped from the migrations folder
-migrations = populate_migrations()
+# Migrations are automatically scraped from the migrations folder on first
+# use; importing every migration module at import time taxed commands that
+# never run them (backup, dump, setup)
+migrations = None
 
 
-# NOTE: Everything is returned as a dict of dicts of strings. If you are looking for bools or values
-#     : you'll need to convert them yourself.
-def populate_settings():
-    settings = {}
-    default_settings = {}
+def get_migrations():
+    global migrations
+    if migrations is None:
+        migrations = populate_migrations()
+    return migrations
 
-    def load_into_dict(filename, settings):
-        if os.path.exists(filename) and os.path.isfile(filename):
-            try:
-                with open(filename) as f:
-                    filename_key = filename[:-4].split(os.sep)[-1]
-
-                    # Get or default, so we update any existing dict
-                    # instead of wiping it out
-                    current_settings = settings.get(filename_key, {})
-                    for line in f.readlines():
-                        if not line:
-                            break
-
-                        if "=" in line:
-                            # remove newline
-                            line = line.replace("\n", "")
-
-                            # NOTE: Do not use split or rsplit in herewithout a counter,
-                            #     : to make sure you leave the contents of val alone!
-                            parts = line.split("=", 1)
 
-                            key = parts[0].strip()
-                            val = parts[1].strip()
+# Matches 'KEY = val' settings lines, stripping surrounding quotes, a trailing
+# comma and any inline -- comment in a single pass. Commented-out entries and
+# lines without an assignment do not match.
+setting_line_re = re.compile(
+    r'^\s*(?!--)([^=\s]+)\s*=\s*"?([^"\n]*?)"?\s*,?\s*(?:--.*)?$'
+)
 
-                            # ignore commented out entries
-                            if key.startswith("--"):
-                                continue
 
-                            # strip off comments
-                            val = val.rsplit("--")[0].strip()
+# Per-file parse results keyed on path, stored with the mtime they were parsed
+# at, so repeat scans only re-parse files that actually changed
+settings_file_cache = {}
 
-                            # pop off leading quote
-                            if val.startswith('"'):
-                                val = val[1:]
+# The (settings, default_settings) pair from the last scan
+populated_settings = None
 
-                            # pop off trailing comma
-                            if val.endswith(","):
-                                val = val[:-1]
 
-                            # pop off trailing quote
-                            if val.endswith('"'):
-                                val = val[:-1]
-
-                            current_settings[key] = val
-
-                        settings[filename_key] = current_settings
-            except Exception as e:
-                print_red("Error fetching settings.")
-                print(e)
-                return False
+# NOTE: Everything is returned as a dict of dicts of strings. If you are looking for bools or values
+#     : you'll need to convert them yourself.
+#     : Passing a set of setting names as keys stops parsing each file early
+#     : once they have all been seen; partial results are not cached.
+def populate_settings(force=False, keys=None):
+    global populated_settings
+    if populated_settings is not None and not force:
+        return populated_settings
 
-    for filename in os.listdir(from_server_path("settings/default")):
-        full_path = from_server_path("settings/default")
-        load_into_dict(os.path.join(full_path, filename), default_settings)
-        load_into_dict(os.path.join(full_path, filename), settings)
+    settings = {}
+    default_settings = {}
 
-    for filename in os.listdir(from_server_path("settings")):
-        full_path = from_server_path("settings")
-        load_into_dict(os.path.join(full_path, filename), settings)
+    def parse_file(entry):
+        mtime = entry.stat().st_mtime_ns
+        cached = settings_file_cache.get(entry.path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        parsed = {}
+        remaining = set(keys) if keys else None
+        try:
+            # Read raw bytes and decode once, rather than paying for
+            # per-line text decoding
+            with open(entry.path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            print_red(f"Error reading {entry.path}: {e}")
+            return None
+
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            match = setting_line_re.match(line)
+            if match:
+                parsed[match.group(1)] = match.group(2).strip()
+                if remaining is not None:
+                    remaining.discard(match.group(1))
+                    if not remaining:
+                        break
+        if keys is None:
+            settings_file_cache[entry.path] = (mtime, parsed)
+        return parsed
+
+    def collect_entries(path):
+        # Settings are .lua files; skip anything else (editor backups,
+        # .DS_Store, etc.) so stray entries aren't opened and the [:-4]
+        # key slice can't mangle their names
+        with os.scandir(path) as entries:
+            return [
+                entry
+                for entry in entries
+                if entry.is_file() and entry.name.endswith(".lua")
+            ]
+
+    def parse_all(entries):
+        # Files are independent, so overlap the reads with a small thread
+        # pool; results are merged in the main thread below to keep the
+        # default-then-override order intact
+        if len(entries) < 4:
+            return [parse_file(entry) for entry in entries]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            return list(executor.map(parse_file, entries))
+
+    def load_into_dict(entry, parsed, settings):
+        if parsed is None:
+            return
+
+        # Get or default, so we update any existing dict
+        # instead of wiping it out
+        current_settings = settings.get(entry.name[:-4], {})
+        current_settings.update(parsed)
+        settings[entry.name[:-4]] = current_settings
+
+    default_entries = collect_entries(default_settings_path)
+    for entry, parsed in zip(default_entries, parse_all(default_entries)):
+        load_into_dict(entry, parsed, default_settings)
+        load_into_dict(entry, parsed, settings)
+
+    user_entries = collect_entries(user_settings_path)
+    for entry, parsed in zip(user_entries, parse_all(user_entries)):
+        load_into_dict(entry, parsed, settings)
 
     # DEBUG:
     # for k, v in settings.items():
@@ -171,6 +223,9 @@ def populate_settings():
     #         print(f"| {k} | {ik} | {iv} |")
     # exit()
 
+    if keys is None:
+        populated_settings = (settings, default_settings)
+        return populated_settings
     return settings, default_settings
 
 
@@ -217,7 +272,11 @@ player_data = [
     "unity_system.sql",
 ]
 
+# O(1) membership tests; the list above keeps the import/backup order
+player_data_set = frozenset(player_data)
+
 import_files = []
+module_files = []
 import_protected = []
 backups = []
 database = None
@@ -227,7 +286,7 @@ login = None
 password = None
 db = None
 cur = None
-repo = Repo(server_dir_path)
+repo = None
 db_ver = ""
 current_client = None
 release_version = None
@@ -248,34 +307,81 @@ else:
 colorama.init(autoreset=True)
 
 
-# Redirect errors through this to hide annoying password warning
 def fetch_errors(result):
-    for line in result.stderr.splitlines():
-        # Safe to ignore this warning
-        if "Using a password on the command line interface can be insecure" not in line:
-            print_red(line)
+    if result.returncode == 0 and not result.stderr:
+        return
+    # One colored write for the whole block instead of a call per line
+    errors = result.stderr.rstrip()
+    if errors:
+        sys.stdout.write(f"{RED}{errors}{RESET}\n")
+
+
+connection_pool = None
+connection_pool_lock = threading.Lock()
+
+# Cap for parallel DB work, matching the pool size below; override with
+# the env var when the default doesn't suit the machine or server
+pool_workers = int(os.getenv("XI_DBTOOL_POOL_WORKERS") or min(8, os.cpu_count() or 1))
+
+
+# Hand out per-worker connections for parallel paths; the interactive flow
+# keeps using the single module-level connection
+def get_pool_connection():
+    global connection_pool
+    if connection_pool is None:
+        # Dump workers all start at once and building the pool opens
+        # pool_size connections, so without the lock several threads can
+        # pass the None check and the duplicate pool_name raises
+        with connection_pool_lock:
+            if connection_pool is None:
+                connection_pool = mariadb.ConnectionPool(
+                    pool_name="dbtool",
+                    pool_size=pool_workers,
+                    host=host,
+                    port=port,
+                    user=login,
+                    passwd=password,
+                    db=database,
+                )
+    return connection_pool.get_connection()
+
+
+# Run a single statement on the persistent connection, avoiding a mysql
+# subprocess (fork/exec plus an auth round trip) per query. Returns the
+# fetched rows for SELECTs, None otherwise. SOURCE-based imports and
+# multi-statement scripts still go through db_query and the mysql client.
+def db_execute(query):
+    if not cur:
+        connect()
+    cur.execute(query)
+    if cur.description:
+        return cur.fetchall()
+    db.commit()
+    return None
 
 
 def db_query(query):
     result = subprocess.run(
-        [
-            f"{mysql_bin}mysql{exe}",
-            f"-h{host}",
-            f"-P{str(port)}",
-            f"-u{login}",
-            f"-p{password}",
-            database,
-            f"-e {query}",
-        ],
+        [f"{mysql_bin}mysql{exe}", *mysql_base_args, database, f"-e {query}"],
         capture_output=True,
         text=True,
+        env=mysql_proc_env,
     )
     fetch_errors(result)
     return result
 
 
+# Connection arguments and environment shared by every mysql/mysqldump
+# invocation, rebuilt whenever credentials are fetched. The password goes
+# through MYSQL_PWD so it stays off the command line (and the client stops
+# warning about it)
+mysql_base_args = []
+mysql_proc_env = None
+
+
 def fetch_credentials():
     global settings, database, host, port, login, password
+    global mysql_base_args, mysql_proc_env
     database = (
         os.getenv("XI_NETWORK_SQL_DATABASE") or settings["network"]["SQL_DATABASE"]
     )
@@ -285,6 +391,17 @@ def fetch_credentials():
     password = (
         os.getenv("XI_NETWORK_SQL_PASSWORD") or settings["network"]["SQL_PASSWORD"]
     )
+    mysql_base_args = [f"-h{host}", f"-P{str(port)}", f"-u{login}"]
+    mysql_proc_env = {**os.environ, "MYSQL_PWD": str(password)}
+
+
+# Instantiating a Repo isn't free, so defer it until something actually
+# needs version information
+def get_repo():
+    global repo
+    if repo is None:
+        repo = Repo(server_dir_path)
+    return repo
 
 
 def fetch_versions():
@@ -295,7 +412,8 @@ def fetch_versions():
     release_client = None
 
     try:
-        release_version = repo.git.rev_parse(repo.head.object.hexsha, short=4)
+        git_repo = get_repo()
+        release_version = git_repo.git.rev_parse(git_repo.head.object.hexsha, short=4)
     except Exception as e:
         print_red("Unable to read current version hash.")
         print(e)
@@ -309,23 +427,35 @@ def fetch_versions():
         fetch_files()
 
 
+# Parsed config.yaml keyed on (path, mtime, size) so repeat calls skip the
+# YAML parse when the file hasn't changed
+config_cache = {}
+
+
 def fetch_configs():
     global mysql_bin, auto_backup, auto_update_client, db_ver
     try:
-        if os.path.exists(from_dbtool_path("config.yaml")):
-            with open(from_dbtool_path("config.yaml")) as file:
-                configs = yaml.full_load(file)
-                for config in configs:
-                    for key, value in config.items():
-                        if key == "mysql_bin":
-                            if value != "":
-                                mysql_bin = value
-                        if key == "auto_backup":
-                            auto_backup = int(value)
-                        if key == "auto_update_client":
-                            auto_update_client = bool(value)
-                        if key == "db_ver":
-                            db_ver = value
+        if os.path.exists(config_path):
+            stat = os.stat(config_path)
+            cache_key = (config_path, stat.st_mtime_ns, stat.st_size)
+            configs = config_cache.get(cache_key)
+            if configs is None:
+                # libyaml decodes bytes itself, faster than TextIOWrapper
+                with open(config_path, "rb", buffering=65536) as file:
+                    configs = yaml.load(file, Loader=YamlLoader)
+                config_cache.clear()
+                config_cache[cache_key] = configs
+            for config in configs:
+                for key, value in config.items():
+                    if key == "mysql_bin":
+                        if value != "":
+                            mysql_bin = value
+                    if key == "auto_backup":
+                        auto_backup = int(value)
+                    if key == "auto_update_client":
+                        auto_update_client = bool(value)
+                    if key == "db_ver":
+                        db_ver = value
         else:
             write_configs()
     except Exception as e:
@@ -333,60 +463,69 @@ def fetch_configs():
 
 
 def write_configs():
-    with open(from_dbtool_path("config.yaml"), "w") as file:
+    with open(config_path, "w") as file:
         dump = [
             {"mysql_bin": mysql_bin},
             {"auto_backup": auto_backup},
             {"auto_update_client": auto_update_client},
             {"db_ver": db_ver},
         ]
-        yaml.dump(dump, file)
+        yaml.dump(dump, file, Dumper=YamlDumper)
+    # The file on disk changed, so any cached parse is stale
+    config_cache.clear()
 
 
 def fetch_module_files():
+    module_files.clear()
     with open(from_server_path("modules/init.txt"), "r") as file:
         for line in file.readlines():
             if not line.startswith("#") and line.strip() and not line in ["\n", "\r\n"]:
                 line = from_server_path("modules/" + line.strip())
                 if pathlib.Path(line).is_dir():
                     for filename in sorted(pathlib.Path(line).glob("**/*.sql")):
-                        import_files.append(str(filename).replace("\\", "/"))
+                        module_files.append(str(filename).replace("\\", "/"))
                 else:
                     if line.endswith(".sql"):
-                        import_files.append(str(line).replace("\\", "/"))
+                        module_files.append(str(line).replace("\\", "/"))
+    import_files.extend(module_files)
 
 
 def check_protected():
     global import_protected, express_enabled
     if not cur:
         connect()
-    import_protected.clear()
-    for table in player_data:
-        import_protected.append("'" + table[:-4] + "'")
+    table_names = [table[:-4] for table in player_data]
+    placeholders = ", ".join(["?"] * len(table_names))
     cur.execute(
-        f"SELECT TABLE_NAME FROM `information_schema`.`tables` WHERE `TABLE_SCHEMA` = '{database}' AND `TABLE_NAME` IN ({', '.join(import_protected)})"
+        f"SELECT TABLE_NAME FROM `information_schema`.`tables` WHERE `TABLE_SCHEMA` = ? AND `TABLE_NAME` IN ({placeholders})",
+        (database, *table_names),
     )
-    tables = cur.fetchall()
-    import_protected.clear()
-    for value in tables:
-        import_protected.append("".join(value) + ".sql")
+    present = {row[0] + ".sql" for row in cur.fetchall()}
     import_protected = [
-        from_server_path("sql/" + value)
-        for value in player_data
-        if value not in import_protected
+        from_server_path("sql/" + value) for value in player_data if value not in present
     ]
     if import_protected:
         express_enabled = True
 
 
+# git diffs between the configured db_ver and the release hash walk the
+# object database and are stable within one run, so cache them per hash pair
+diff_cache = {}
+
+
+def cached_diff(paths):
+    key = (db_ver, release_version, paths)
+    if key not in diff_cache:
+        diff_cache[key] = get_repo().commit(db_ver).diff(release_version, paths=paths)
+    return diff_cache[key]
+
+
 def fetch_files(express=False):
     import_files.clear()
     if express:
         try:
             global express_enabled
-            sql_diffs = repo.commit(db_ver).diff(
-                release_version, paths=from_server_path("sql/")
-            )
+            sql_diffs = cached_diff(from_server_path("sql/"))
             if len(sql_diffs) > 0:
                 for diff in sql_diffs:
                     if os.path.exists(from_server_path(diff.b_path)):
@@ -395,40 +534,34 @@ def fetch_files(express=False):
                     express_enabled = True
             else:
                 express_enabled = False
-                if (
-                    len(
-                        repo.commit(db_ver).diff(
-                            release_version, paths=from_server_path("tools/migrations")
-                        )
-                    )
-                    > 0
-                ):
+                if len(cached_diff(from_server_path("tools/migrations"))) > 0:
                     express_enabled = True
         except Exception as e:
             print_red("Error checking diffs.\nCheck that hash is valid in config.yaml.")
             print(e)
     else:
-        for _, _, filenames in os.walk(from_server_path("sql/")):
-            for filename in sorted(filenames):
-                if filename.endswith(".sql"):
-                    import_files.append(from_server_path("sql/" + filename))
-            break
+        with os.scandir(from_server_path("sql/")) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".sql"):
+                    import_files.append(entry.path)
     check_protected()
     backups.clear()
-    for _, _, filenames in os.walk(from_server_path("sql/backups/")):
-        for file in sorted(filenames):
-            if not ".gitignore" in file:
-                if file.endswith(".sql"):
-                    backups.append(from_server_path("sql/backups/" + file))
-        break
+    with os.scandir(from_server_path("sql/backups/")) as entries:
+        for entry in entries:
+            if (
+                entry.is_file()
+                and entry.name.endswith(".sql")
+                and ".gitignore" not in entry.name
+            ):
+                backups.append(entry.path)
     backups.sort()
     import_files.sort()
-    try:
-        import_files.append(
-            import_files.pop(import_files.index(from_server_path("sql/triggers.sql")))
-        )
-    except Exception:
-        pass
+    # Triggers have to go last; a single partition pass handles the file
+    # appearing zero, one or several times
+    triggers_path = from_server_path("sql/triggers.sql")
+    if triggers_path in import_files:
+        import_files[:] = [f for f in import_files if f != triggers_path]
+        import_files.append(triggers_path)
     fetch_module_files()
 
 
@@ -463,7 +596,9 @@ def write_version(silent=False):
 
 def import_file(file):
     file = os.path.normpath(file).replace("\\", "/")
-    if not os.path.exists(file):
+    try:
+        os.stat(file)
+    except OSError:
         print_red(
             f"Trying to import file that does not exist ({file}), or is an incomplete path."
         )
@@ -473,6 +608,67 @@ def import_file(file):
     _ = db_query(query)
 
 
+# Create the schema over a short-lived server-only connection instead of
+# shelling out to the mysql client
+def create_database():
+    try:
+        admin_db = mariadb.connect(host=host, user=login, passwd=password, port=port)
+        admin_cur = admin_db.cursor()
+        admin_cur.execute(
+            f"CREATE DATABASE IF NOT EXISTS {database} CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci"
+        )
+        admin_cur.close()
+        admin_db.close()
+    except mariadb.Error as err:
+        print_red(str(err))
+
+
+# Import several files through one mysql session: a single fork/exec and
+# auth handshake instead of one per file. The client's SOURCE command still
+# does the file reading, so DELIMITER blocks and the like work exactly as
+# they do on the per-file path.
+def import_file_batch(files):
+    source_files = []
+    for file in files:
+        file = os.path.normpath(file).replace("\\", "/")
+        try:
+            os.stat(file)
+        except OSError:
+            print_red(
+                f"Trying to import file that does not exist ({file}), or is an incomplete path."
+            )
+            continue
+        print("Importing " + file)
+        source_files.append(file)
+    if not source_files:
+        return
+    query = (
+        "SET autocommit=0; SET unique_checks=0; SET foreign_key_checks=0;\n"
+        + "\n".join(f"SOURCE {file};" for file in source_files)
+        + "\nSET unique_checks=1; SET foreign_key_checks=1; COMMIT;"
+    )
+    result = subprocess.run(
+        [f"{mysql_bin}mysql{exe}", *mysql_base_args, database],
+        input=query,
+        capture_output=True,
+        text=True,
+        env=mysql_proc_env,
+    )
+    # The client aborts the whole stdin session on the first error, which
+    # would skip every file after the failing one and lose the trailing
+    # COMMIT. Fall back to the per-file path so one bad file can't take the
+    # rest of the batch down with it and each error is tied to its file.
+    if result.returncode != 0:
+        fetch_errors(result)
+        print_red(
+            f"Batched import failed; retrying these {len(source_files)} files individually:"
+        )
+        for file in source_files:
+            import_file(file)
+        return
+    fetch_errors(result)
+
+
 def connect():
     global db, cur
     try:
@@ -494,19 +690,7 @@ def connect():
                 ).lower()
                 == "y"
             ):
-                result = subprocess.run(
-                    [
-                        f"{mysql_bin}mysql{exe}",
-                        f"-h{host}",
-                        f"-P{str(port)}",
-                        f"-u{login}",
-                        f"-p{password}",
-                        f"-e CREATE DATABASE {database} CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci",
-                    ],
-                    capture_output=True,
-                    text=True,
-                )
-                fetch_errors(result)
+                create_database()
                 setup_db()
                 connect()
             else:
@@ -529,8 +713,21 @@ def close():
 
 def setup_db():
     fetch_files()
-    for sql_file in import_files:
-        import_file(sql_file)
+
+    # With unique/FK checks disabled each base table file is independent, so
+    # import them concurrently. Triggers and module files can touch tables
+    # created by the base files, so they keep their sequential order at the
+    # end (matching the order fetch_files built).
+    sequential = set(module_files)
+    sequential.add(from_server_path("sql/triggers.sql"))
+    parallel_files = [f for f in import_files if f not in sequential]
+
+    # One mysql session per worker, each sourcing a slice of the files
+    chunks = [parallel_files[i::pool_workers] for i in range(pool_workers)]
+    with ThreadPoolExecutor(max_workers=pool_workers) as executor:
+        list(executor.map(import_file_batch, chunks))
+    import_file_batch([f for f in import_files if f in sequential])
+
     print_green("Finished importing!")
     write_version()
 
@@ -546,10 +743,11 @@ def backup_db(silent=False, lite=False):
             f"{mysql_bin}mysqldump{exe}",
             "--hex-blob",
             "--add-drop-trigger",
-            f"-h{host}",
-            f"-P{str(port)}",
-            f"-u{login}",
-            f"-p{password}",
+            # Row-by-row streaming; on by default via --opt, but stated
+            # explicitly so a skip-opt in someone's my.cnf can't turn a
+            # backup into a buffer-the-whole-table run
+            "--quick",
+            *mysql_base_args,
             database,
         ]
         if lite:
@@ -569,6 +767,7 @@ def backup_db(silent=False, lite=False):
                 stdout=outfile,
                 stderr=subprocess.PIPE,
                 text=True,
+                env=mysql_proc_env,
             )
             fetch_errors(result)
             print_green("Database saved!")
@@ -595,14 +794,17 @@ def update_db(silent=False, express=False):
         if import_files:
             print_green("The following files will be imported:")
             for sql_file in import_files:
-                if pathlib.Path(sql_file).name not in player_data:
+                if pathlib.Path(sql_file).name not in player_data_set:
                     print(os.path.normpath(sql_file).replace("\\", "/"))
     if silent or input("Proceed with update? [y/N] ").lower() == "y":
-        for sql_file in import_protected:
-            import_file(sql_file)
-        for sql_file in import_files:
-            if pathlib.Path(sql_file).name not in player_data:
-                import_file(sql_file)
+        import_file_batch(import_protected)
+        import_file_batch(
+            [
+                sql_file
+                for sql_file in import_files
+                if pathlib.Path(sql_file).name not in player_data_set
+            ]
+        )
         print_green("Finished importing!")
         express_enabled = False
         run_all_migrations(silent or express)
@@ -667,7 +869,7 @@ def adjust_auto_update_client():
 def run_all_migrations(silent=False):
     migrations_needed = []
     print_green("Checking migrations...")
-    for migration in migrations:
+    for migration in get_migrations():
         check_migration(migration, migrations_needed, silent)
     if len(migrations_needed) > 0:
         if not silent:
@@ -801,7 +1003,7 @@ def set_external_ip(ip_str):
     """
     print("Executing query:")
     print(query)
-    _ = db_query(query)
+    db_execute(query)
 
 
 def set_external_ip_dialog():
@@ -831,8 +1033,10 @@ def print_db_tables_by_size():
 
     print("Executing query:")
     print(query)
-    result = db_query(query)
-    print(result.stdout)
+    result = db_execute(query)
+    print("Table\tSize (MB)")
+    for table, size in result:
+        print(f"{table}\t{size}")
 
 
 def offload_to_auction_house_history():
@@ -863,9 +1067,11 @@ def offload_to_auction_house_history():
     for itemid in items:
         if index % 500 == 0:
             percent = (index / len(items)) * 100
-            print(
-                f"Offloading historical data auction_house data: {percent:.1f}% ({index}/{len(items)})"
+            # Redraw a single progress line instead of printing a new one
+            sys.stdout.write(
+                f"\r\x1b[2KOffloading historical auction_house data: {percent:.1f}% ({index}/{len(items)})"
             )
+            sys.stdout.flush()
         index = index + 1
 
         query = f"""
@@ -915,6 +1121,7 @@ def offload_to_auction_house_history():
         """
         db_query(query)
 
+    sys.stdout.write("\r\x1b[2K")
     print("Done!")
 
     print("Number of rows in auction_house (before):")
@@ -994,25 +1201,20 @@ def present_menu(title, contents):
 
 
 def configure_and_launch_multi_process_by_modulus(mod):
-    # Build query string based on mod
-    query = ""
+    # Build and run one UPDATE per process slot
     for idx in range(0, mod):
-        query += f"UPDATE xidb.zone_settings SET zoneport = 54230 + {idx} WHERE zoneid % {mod} = {idx};\n"
-
-    print(query)
-    db_query(query)
+        query = f"UPDATE xidb.zone_settings SET zoneport = 54230 + {idx} WHERE zoneid % {mod} = {idx};"
+        print(query)
+        db_execute(query)
 
-    result = db_query("SELECT DISTINCT zoneip FROM xidb.zone_settings;")
+    zoneip = db_execute("SELECT DISTINCT zoneip FROM xidb.zone_settings;")[0][0]
 
-    zoneip = result.stdout.split("\n")[1]
-
-    result = db_query(
-        f"""
-        SELECT DISTINCT zoneport from zone_settings ORDER BY zoneport ASC;
-        """
-    )
-
-    ports = result.stdout.split("\n")[1:-1]
+    ports = [
+        str(row[0])
+        for row in db_execute(
+            "SELECT DISTINCT zoneport from zone_settings ORDER BY zoneport ASC;"
+        )
+    ]
 
     executable = from_server_path(f"xi_map{exe}")
 
@@ -1048,120 +1250,166 @@ def update_submodules():
     # fmt: on
 
 
-def update_sql_from_db(table_name):
-    try:
-        # Fetch all rows from the specified table
-        cur.execute(f"SELECT * FROM {table_name};")
-        rows = cur.fetchall()
+# Deleting every printable ASCII byte from a value leaves nothing iff the
+# value is pure printable text; bytes.translate runs the scan in C
+ascii_printable = bytes(range(32, 127))
 
-        # Read the SQL file
-        with open(
-            from_server_path(f"sql/{table_name}.sql"), "r", encoding="utf-8"
-        ) as file:
-            sql_lines = file.readlines()
+
+def update_sql_from_db(table_name, connection=None):
+    db_cur = None
+    try:
+        sql_path = from_server_path(f"sql/{table_name}.sql")
+        tmp_path = sql_path + ".tmp"
+
+        # Parallel callers pass their own pooled connection and get an
+        # unbuffered cursor, so rows stream off the socket while the file
+        # scan consumes them; the interactive flow falls back to the shared
+        # module-level cursor, which stays buffered because later queries
+        # reuse that connection
+        db_cur = connection.cursor(buffered=False) if connection else cur
+
+        # Stream rows from the specified table as INSERT lines are found,
+        # rather than materializing the whole table with fetchall()
+        db_cur.execute(f"SELECT * FROM {table_name};")
+        row_iter = iter(db_cur)
+
+        # Column metadata is constant across rows, so resolve the float
+        # formatting precision per column once instead of chasing the
+        # description tuples for every cell.
+        # https://github.com/mariadb-corporation/mariadb-connector-python/blob/67d3062ad597cca8d5419b2af2ad8b62528204e5/mariadb/mariadb_cursor.c#L777-L787
+        float_precision = [
+            d[5] if d[1] == mariadb.constants.FIELD_TYPE.FLOAT and d[5] > 0 else None
+            for d in db_cur.description
+        ]
 
         sql_variables = {}
-        updated_lines = []
-        row_index = 0
-
-        # Iterate over the lines in the file
-        for line in sql_lines:
-            # Scan for variables
-            if line.strip().startswith("SET @"):
-                parts = line.strip().split("=")
-                var_name = parts[0].split()[1]
-                var_value = parts[1].replace(";", "").split("--")[0].strip()
-                sql_variables[var_value] = var_name
-            # Scan for INSERT
-            lowercase_line = line.strip().lower()
-            insert_start = re.match(
-                rf"insert into `{table_name}` values \(", lowercase_line
-            )
-            if insert_start:
-                # Build a string using the values pulled from the database
-                values = rows[row_index]
-                updated_values = []
-                for i, value in enumerate(values):
-                    # NULL
-                    if value is None:
-                        updated_values.append("NULL")
-                    # Binary
-                    elif isinstance(value, bytes):
-                        if len(value) == 0:
-                            updated_values.append(f"''")
-                        # npc_list name field is binary but should be decoded for the sql files
-                        elif table_name == "npc_list" and i == 1:
-                            text = True
-                            for j in value:
-                                if j < 32 or j > 126:  # ascii printable characters
-                                    text = False
-                                    break
-                            if text:
-                                updated_values.append(f"'{value.decode('latin_1')}'")
-                            # If the value contains non-printable characters, use hex instead
-                            else:
-                                hex_value = value.hex().upper()
-                                updated_values.append(f"0x{hex_value}")
-                        # Otherwise print binary in 0x hex form
-                        else:
-                            hex_value = value.hex().upper()
-                            updated_values.append(f"0x{hex_value}")
-                    # String
-                    elif isinstance(value, str):
-                        escaped_value = value.replace("'", "\\'")
-                        updated_values.append(f"'{escaped_value}'")
-                    # Number
+
+        # Compiled once per table; matching it per line would recompile the
+        # pattern for every line of the file
+        insert_re = re.compile(rf"insert into `{re.escape(table_name)}` values \(")
+
+        # One formatter per column, built at the first INSERT line (after
+        # every SET @ variable has been scanned). Specializing the special
+        # columns and the float precision up front collapses the per-cell
+        # branch chain into a single indexed call.
+        formatters = None
+
+        def build_formatters():
+            def fmt_generic(value):
+                if isinstance(value, bytes):
+                    if len(value) == 0:
+                        return "''"
+                    # Print binary in 0x hex form
+                    return "0x" + value.hex().upper()
+                if isinstance(value, str):
+                    return "'" + value.replace("'", "\\'") + "'"
+                return str(value)
+
+            def fmt_float(precision):
+                def fmt(value):
+                    return f"{value:.{precision}f}"
+
+                return fmt
+
+            # npc_list name field is binary but should be decoded for the sql
+            # files; names with non-printable characters use hex instead
+            def fmt_npc_name(value):
+                if value and not value.translate(None, ascii_printable):
+                    return "'" + value.decode("latin_1") + "'"
+                return fmt_generic(value)
+
+            # mob_droplist and pet_skills use variables for certain fields
+            def fmt_droplist_var(value):
+                return sql_variables.get(str(value)) or fmt_generic(value)
+
+            # Parse the variable values once and memoize the joined flag
+            # strings; flag columns carry few distinct values, so the cache
+            # hit rate is high
+            def make_fmt_flags():
+                var_ints = [(int(var), name) for var, name in sql_variables.items()]
+                flag_cache = {}
+
+                def fmt_flags(value):
+                    cached = flag_cache.get(value)
+                    if cached is None:
+                        cached = " | ".join(
+                            name for var, name in var_ints if value & var
+                        )
+                        flag_cache[value] = cached
+                    return cached
+
+                return fmt_flags
+
+            column_formatters = []
+            for i in range(len(db_cur.description)):
+                if table_name == "npc_list" and i == 1:
+                    column_formatters.append(fmt_npc_name)
+                elif table_name == "mob_droplist" and i == 5:
+                    column_formatters.append(fmt_droplist_var)
+                elif table_name == "pet_skills" and i == 9:
+                    column_formatters.append(make_fmt_flags())
+                elif float_precision[i]:
+                    column_formatters.append(fmt_float(float_precision[i]))
+                else:
+                    column_formatters.append(fmt_generic)
+            return column_formatters
+
+        # Stream the rewrite through a temporary sibling file instead of
+        # holding the original and updated contents in memory, then swap it
+        # into place atomically
+        with open(sql_path, "r", encoding="utf-8") as fin, open(
+            tmp_path, "w", encoding="utf-8"
+        ) as fout:
+            # Iterate over the lines in the file
+            for line in fin:
+                stripped = line.strip()
+                # Scan for variables
+                if stripped.startswith("SET @"):
+                    parts = stripped.split("=")
+                    var_name = parts[0].split()[1]
+                    var_value = parts[1].replace(";", "").split("--")[0].strip()
+                    sql_variables[var_value] = var_name
+                # Scan for INSERT; cheap prefix check before lowercasing the
+                # whole line and running the regex
+                insert_start = None
+                if stripped[:6].lower() == "insert":
+                    insert_start = insert_re.match(stripped.lower())
+                if insert_start:
+                    if formatters is None:
+                        formatters = build_formatters()
+                    # Build a string using the values pulled from the database
+                    values = next(row_iter)
+                    updated_values = [
+                        "NULL" if value is None else formatters[i](value)
+                        for i, value in enumerate(values)
+                    ]
+                    values = ",".join(updated_values)
+                    # Replace the values in the current line with the values pulled from the database
+                    updated_line = line[: insert_start.end()] + f"{values});"
+                    # Append any comments, preserving whitespace
+                    if "--" in line:
+                        insert_end = line.index(");") + 2
+                        before_comment = line[insert_end:].split("--")[0]
+                        updated_line = f"{updated_line}{before_comment}{line[insert_end + len(before_comment):]}"
                     else:
-                        # mob_droplist and pet_skills use variables for certain fields
-                        if (
-                            table_name == "mob_droplist"
-                            and i == 5
-                            and str(value) in sql_variables
-                        ):
-                            updated_values.append(sql_variables[str(value)])
-                        elif table_name == "pet_skills" and i == 9:
-                            var_list = []
-                            for var in sql_variables.keys():
-                                if value & int(var):
-                                    var_list.append(sql_variables[var])
-                            updated_values.append(" | ".join(var_list))
-                        else:
-                            # Get float formatting from the cursor description.
-                            # https://github.com/mariadb-corporation/mariadb-connector-python/blob/67d3062ad597cca8d5419b2af2ad8b62528204e5/mariadb/mariadb_cursor.c#L777-L787
-                            if (
-                                cur.description[i][1]
-                                == mariadb.constants.FIELD_TYPE.FLOAT
-                                and cur.description[i][5] > 0
-                            ):
-                                updated_values.append(
-                                    f"{value:.{cur.description[i][5]}f}"
-                                )
-                            else:
-                                updated_values.append(str(value))
-                values = ",".join(updated_values)
-                # Replace the values in the current line with the values pulled from the database
-                updated_line = line[: insert_start.end()] + f"{values});"
-                # Append any comments, preserving whitespace
-                if "--" in line:
-                    insert_end = line.index(");") + 2
-                    before_comment = line[insert_end:].split("--")[0]
-                    updated_line = f"{updated_line}{before_comment}{line[insert_end + len(before_comment):]}"
+                        updated_line = f"{updated_line}\n"
+                    fout.write(updated_line)
+                # Otherwise just write the line as-is
                 else:
-                    updated_line = f"{updated_line}\n"
-                updated_lines.append(updated_line)
-                row_index += 1
-            # Otherwise just save the line as-is
-            else:
-                updated_lines.append(line)
+                    fout.write(line)
 
-        # Write the updated content back to the file
-        with open(
-            from_server_path(f"sql/{table_name}.sql"), "w", encoding="utf-8"
-        ) as file:
-            file.writelines(updated_lines)
+        os.replace(tmp_path, sql_path)
 
     except Exception as e:
         print_red(f"Error: {e}")
+    finally:
+        # An unbuffered cursor can still hold unread rows when the table
+        # has more of them than the file has INSERT lines; close it before
+        # the connection goes back to the pool so the result set is drained
+        # rather than left on the wire. The shared module-level cursor stays
+        # open for later queries.
+        if connection is not None and db_cur is not None:
+            db_cur.close()
 
 
 def dump_table(table_name=None, silent=False):
@@ -1173,16 +1421,36 @@ def dump_table(table_name=None, silent=False):
 
 def dump_all_tables(silent=False):
     if silent or input("Dump all database tables to .sql files? [y/N] ").lower() == "y":
-        dump_tables = []
-        for _, _, filenames in os.walk(from_server_path("sql/")):
-            for filename in sorted(filenames):
-                if filename.endswith(".sql"):
-                    dump_tables.append(filename)
-            break
-        dump_tables.remove("triggers.sql")
-        for table in dump_tables:
-            if table not in player_data:
-                update_sql_from_db(table[:-4])
+        # Filter triggers and protected tables during discovery rather than
+        # with a list .remove() and a second pass afterwards
+        with os.scandir(from_server_path("sql/")) as entries:
+            dump_tables = sorted(
+                entry.name[:-4]
+                for entry in entries
+                if entry.is_file()
+                and entry.name.endswith(".sql")
+                and entry.name != "triggers.sql"
+                and entry.name not in player_data_set
+            )
+
+        # Each table is dumped over its own pooled connection, so the
+        # SELECTs and file rewrites can overlap
+        def dump_one(table):
+            connection = get_pool_connection()
+            try:
+                update_sql_from_db(table, connection)
+            finally:
+                connection.close()
+
+        completed = 0
+        with ThreadPoolExecutor(max_workers=pool_workers) as executor:
+            for _ in executor.map(dump_one, dump_tables):
+                completed += 1
+                sys.stdout.write(
+                    f"\r\x1b[2KDumping tables... {completed}/{len(dump_tables)}"
+                )
+                sys.stdout.flush()
+        sys.stdout.write("\r\x1b[2K")
         print_green(f"Replaced values in all .sql files with data from the database.")
 
 
@@ -1213,6 +1481,51 @@ def tasks_menu():
     )
 
 
+def backup_command(arg2):
+    backup_db(True, arg2 == "lite")
+
+
+def migrate_command(arg2):
+    if connect() != False:
+        run_all_migrations(True)
+        close()
+
+
+def update_command(arg2):
+    full_update = arg2 == "full"
+    if db_ver and release_version and not express_enabled and not full_update:
+        print_green("Database is up to date.")
+        return
+    if connect() != False:
+        if express_enabled and not full_update:
+            express_update(True)
+        else:
+            update_db(True)
+        close()
+
+
+def setup_command(arg2):
+    if arg2 == database:
+        create_database()
+        setup_db()
+
+
+def dump_command(arg2):
+    if arg2:
+        dump_table(arg2, True)
+    else:
+        dump_all_tables(True)
+
+
+commands = {
+    "backup": backup_command,
+    "migrate": migrate_command,
+    "update": update_command,
+    "setup": setup_command,
+    "dump": dump_command,
+}
+
+
 def main():
     try:
         global mysql_bin, exe
@@ -1225,59 +1538,10 @@ def main():
         fetch_versions()
         # CLI args
         if len(sys.argv) > 1:
-            arg1 = str(sys.argv[1])
-            if "backup" == arg1:
-                if len(sys.argv) > 2 and str(sys.argv[2]) == "lite":
-                    backup_db(True, True)
-                else:
-                    backup_db(True)
-                return
-            elif "migrate" == arg1:
-                if connect() != False:
-                    run_all_migrations(True)
-                    close()
-                return
-            elif "update" == arg1:
-                full_update = False
-                if len(sys.argv) > 2 and str(sys.argv[2]) == "full":
-                    full_update = True
-                if (
-                    db_ver
-                    and release_version
-                    and not express_enabled
-                    and not full_update
-                ):
-                    print_green("Database is up to date.")
-                    return
-                if connect() != False:
-                    if express_enabled and not full_update:
-                        express_update(True)
-                    else:
-                        update_db(True)
-                    close()
-                return
-            elif "setup" == arg1:
-                if len(sys.argv) > 2 and str(sys.argv[2]) == database:
-                    result = subprocess.run(
-                        [
-                            f"{mysql_bin}mysql{exe}",
-                            f"-h{host}",
-                            f"-P{str(port)}",
-                            f"-u{login}",
-                            f"-p{password}",
-                            f"-e CREATE DATABASE {database} CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci",
-                        ],
-                        capture_output=True,
-                        text=True,
-                    )
-                    fetch_errors(result)
-                    setup_db()
-                return
-            elif "dump" == arg1:
-                if len(sys.argv) > 2:
-                    dump_table(str(sys.argv[2]), True)
-                else:
-                    dump_all_tables(True)
+            command = commands.get(str(sys.argv[1]))
+            if command:
+                arg2 = str(sys.argv[2]) if len(sys.argv) > 2 else None
+                command(arg2)
                 return
         # Main loop
         print(colorama.ansi.clear_screen())